@@ -15,17 +15,58 @@ Commands:
     permissions  Test required permissions for dash
     services     Discover AWS services
     config       Show AWS configuration
+
+Options:
+    --all-regions  Run service discovery in every enabled region
+    --mode MODE    Permission check mode: auto (default), simulate, probe
 """
 
-import argparse
+import configparser
+import importlib.util
+import io
 import json
 import os
-import shutil
+import re
 import subprocess
 import sys
-from dataclasses import dataclass
+import threading
+import time
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, NamedTuple, Optional, TextIO
+
+# boto3 takes ~100 ms to import, so it is only located here and imported on
+# first use; config and the CLI fallback never pay for it.
+HAS_BOTO3 = importlib.util.find_spec("boto3") is not None
+
+try:
+    # orjson decodes large listings (e.g. Lambda functions) noticeably faster.
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+# Probes are independent read-only calls; keep the pool small so a burst of
+# them does not trip API throttling.
+PROBE_WORKERS = 8
+CLUSTER_WORKERS = 16
+REGION_WORKERS = 32
+
+# Identical CLI calls within this many seconds share one result.
+COMMAND_CACHE_WINDOW = 5
+
+# Upper bound on concurrent in-flight calls per AWS service, which matters
+# once discovery fans out across every region.
+SERVICE_CONCURRENCY = 8
+
+# Identity lookups are cached on disk briefly so back-to-back runs skip the
+# STS round-trip.
+IDENTITY_CACHE_TTL = 60
+IDENTITY_CACHE_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "aws_check" / "identity.json"
+)
 
 
 class Colors:
@@ -37,70 +78,203 @@ class Colors:
     NC = "\033[0m"
 
 
-def print_header(text: str) -> None:
-    print(f"\n{Colors.BLUE}{'━' * 60}{Colors.NC}")
-    print(f"{Colors.BLUE}  {text}{Colors.NC}")
-    print(f"{Colors.BLUE}{'━' * 60}{Colors.NC}\n")
+# Plain output when piped or when NO_COLOR is set (https://no-color.org).
+if os.environ.get("NO_COLOR") or not sys.stdout.isatty():
+    for _name in ("RED", "GREEN", "YELLOW", "BLUE", "CYAN", "NC"):
+        setattr(Colors, _name, "")
+
+_HEADER_BAR = f"{Colors.BLUE}{'━' * 60}{Colors.NC}"
+_OK = f"{Colors.GREEN}✓{Colors.NC} "
+_ERR = f"{Colors.RED}✗{Colors.NC} "
+_WARN = f"{Colors.YELLOW}!{Colors.NC} "
+_INFO = f"{Colors.BLUE}→{Colors.NC} "
+
 
+def print_header(text: str, file: Optional[TextIO] = None) -> None:
+    (file or sys.stdout).write(
+        "\n" + _HEADER_BAR + "\n" + Colors.BLUE + "  " + text + Colors.NC + "\n" + _HEADER_BAR + "\n\n"
+    )
+
+
+def print_success(text: str, file: Optional[TextIO] = None) -> None:
+    (file or sys.stdout).write(_OK + text + "\n")
 
-def print_success(text: str) -> None:
-    print(f"{Colors.GREEN}✓{Colors.NC} {text}")
 
+def print_error(text: str, file: Optional[TextIO] = None) -> None:
+    (file or sys.stdout).write(_ERR + text + "\n")
 
-def print_error(text: str) -> None:
-    print(f"{Colors.RED}✗{Colors.NC} {text}")
 
+def print_warning(text: str, file: Optional[TextIO] = None) -> None:
+    (file or sys.stdout).write(_WARN + text + "\n")
 
-def print_warning(text: str) -> None:
-    print(f"{Colors.YELLOW}!{Colors.NC} {text}")
 
+def print_info(text: str, file: Optional[TextIO] = None) -> None:
+    (file or sys.stdout).write(_INFO + text + "\n")
 
-def print_info(text: str) -> None:
-    print(f"{Colors.BLUE}→{Colors.NC} {text}")
 
+def write_buffered(buf: io.StringIO, file: Optional[TextIO] = None) -> None:
+    """Emit a section collected in memory with a single write."""
+    target = file or sys.stdout
+    target.write(buf.getvalue())
+    target.flush()
 
-@dataclass
-class CommandResult:
+
+class CommandResult(NamedTuple):
     success: bool
-    stdout: str
-    stderr: str
+    stdout: bytes
+    stderr: bytes
     returncode: int
 
+    @property
+    def error(self) -> str:
+        return self.stderr.decode(errors="replace").strip()
+
+
+@lru_cache(maxsize=1)
+def aws_executable() -> Optional[str]:
+    """Resolve the aws binary once so each spawn skips the $PATH search.
+
+    An absolute path also lets subprocess use its posix_spawn fast path.
+    """
+    import shutil
+
+    return shutil.which("aws")
+
+
+# Never page CLI output; we always read it from a pipe.
+AWS_ENV = {**os.environ, "AWS_PAGER": ""}
 
-def run_aws_command(args: list[str], timeout: int = 30) -> CommandResult:
+# Python opens files non-inheritable, so there is nothing for the child to
+# close; skipping the fd sweep keeps posix_spawn usable on Linux.
+CLOSE_FDS = sys.platform != "linux"
+
+
+_service_limits: dict[str, threading.Semaphore] = {}
+_service_limits_lock = threading.Lock()
+
+
+def _service_limit(service: str) -> threading.Semaphore:
+    with _service_limits_lock:
+        return _service_limits.setdefault(service, threading.Semaphore(SERVICE_CONCURRENCY))
+
+
+def run_aws_command(
+    args: list[str],
+    timeout: int = 30,
+    discard_output: bool = False,
+    region: Optional[str] = None,
+) -> CommandResult:
+    """Run an aws CLI command, reusing identical results from the last few seconds."""
+    window = int(time.monotonic() // COMMAND_CACHE_WINDOW)
+    return _run_aws_command(tuple(args), timeout, discard_output, region, window)
+
+
+@lru_cache(maxsize=64)
+def _run_aws_command(
+    args: tuple[str, ...],
+    timeout: int,
+    discard_output: bool,
+    region: Optional[str],
+    _window: int,
+) -> CommandResult:
+    if region:
+        args += ("--region", region)
     try:
-        result = subprocess.run(
-            ["aws"] + args,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
+        with _service_limit(args[0]):
+            result = subprocess.run(
+                [aws_executable() or "aws", *args],
+                stdout=subprocess.DEVNULL if discard_output else subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+                env=AWS_ENV,
+                close_fds=CLOSE_FDS,
+            )
         return CommandResult(
             success=result.returncode == 0,
-            stdout=result.stdout,
+            stdout=result.stdout or b"",
             stderr=result.stderr,
             returncode=result.returncode,
         )
     except subprocess.TimeoutExpired:
         return CommandResult(
             success=False,
-            stdout="",
-            stderr="Command timed out",
+            stdout=b"",
+            stderr=b"Command timed out",
             returncode=-1,
         )
     except FileNotFoundError:
         return CommandResult(
             success=False,
-            stdout="",
-            stderr="AWS CLI not found",
+            stdout=b"",
+            stderr=b"AWS CLI not found",
             returncode=-1,
         )
 
 
+run_aws_command.cache_clear = _run_aws_command.cache_clear
+
+
+class Probe(NamedTuple):
+    cli_args: tuple[str, ...]
+    service: str
+    operation: str
+    params: Optional[dict[str, Any]] = None
+
+
+_session = None
+_session_lock = threading.Lock()
+_clients: dict[str, Any] = {}
+
+
+@lru_cache(maxsize=1)
+def boto_errors() -> tuple[type[Exception], ...]:
+    """The botocore exceptions a failed API call raises."""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    return BotoCoreError, ClientError
+
+
+def get_client(service: str):
+    global _session
+    # boto3 sessions are not thread-safe, so client creation is serialized.
+    # Clients are cached so repeat calls reuse their connection pool.
+    with _session_lock:
+        client = _clients.get(service)
+        if client is None:
+            if _session is None:
+                import boto3
+
+                _session = boto3.Session()
+            from botocore.config import Config
+
+            client = _session.client(service, config=Config(
+                max_pool_connections=16,
+                tcp_keepalive=True,
+                retries={"max_attempts": 2},
+            ))
+            _clients[service] = client
+        return client
+
+
+def probe(test: Probe) -> CommandResult:
+    """Run a permission probe in-process with boto3, or via the CLI without it."""
+    if not HAS_BOTO3:
+        # Only the exit status matters, so skip capturing the response body.
+        return run_aws_command([*test.cli_args, "--output", "text"], discard_output=True)
+
+    try:
+        client = get_client(test.service)
+        getattr(client, test.operation)(**(test.params or {}))
+    except boto_errors() as e:
+        return CommandResult(success=False, stdout=b"", stderr=str(e).encode(), returncode=1)
+
+    return CommandResult(success=True, stdout=b"", stderr=b"", returncode=0)
+
+
 def check_cli_installed() -> bool:
     print_header("AWS CLI Installation")
 
-    aws_path = shutil.which("aws")
+    aws_path = aws_executable()
     if not aws_path:
         print_error("AWS CLI not found in PATH")
         print("\nInstall with:")
@@ -110,260 +284,572 @@ def check_cli_installed() -> bool:
 
     result = run_aws_command(["--version"])
     if result.success:
-        version = result.stdout.strip()
+        version = result.stdout.strip().decode()
         print_success(f"AWS CLI installed: {version}")
         print_info(f"Path: {aws_path}")
         return True
 
-    print_error(f"Failed to get AWS CLI version: {result.stderr}")
+    print_error(f"Failed to get AWS CLI version: {result.error}")
     return False
 
 
-def check_identity() -> bool:
-    print_header("AWS Identity")
+def _identity_cache_key() -> str:
+    import hashlib
+
+    # Fingerprint the credentials in use, not just the profile name, so a
+    # swapped key or session token never picks up another caller's entry.
+    fingerprint = "\0".join(
+        os.environ.get(var, "")
+        for var in ("AWS_PROFILE", "AWS_DEFAULT_PROFILE", "AWS_ACCESS_KEY_ID", "AWS_SESSION_TOKEN")
+    )
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+def load_cached_identity() -> Optional[dict[str, Any]]:
+    try:
+        entries = json_loads(IDENTITY_CACHE_PATH.read_text())
+        entry = entries[_identity_cache_key()]
+        if time.time() - entry["time"] < IDENTITY_CACHE_TTL:
+            return entry["identity"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
 
+def save_cached_identity(identity: dict[str, Any]) -> None:
+    import tempfile
+
+    try:
+        entries = json_loads(IDENTITY_CACHE_PATH.read_text())
+        if not isinstance(entries, dict):
+            entries = {}
+    except (OSError, ValueError):
+        entries = {}
+
+    now = time.time()
+    entries = {key: entry for key, entry in entries.items()
+               if isinstance(entry, dict) and now - entry.get("time", 0) < IDENTITY_CACHE_TTL}
+    entries[_identity_cache_key()] = {"time": now, "identity": identity}
+    # The entry holds account, ARN and user ID: write it atomically and
+    # owner-only (NamedTemporaryFile creates files with mode 0600).
+    try:
+        IDENTITY_CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=IDENTITY_CACHE_PATH.parent, suffix=".tmp", delete=False
+        ) as f:
+            f.write(json.dumps(entries))
+        os.replace(f.name, IDENTITY_CACHE_PATH)
+    except OSError:
+        pass
+
+
+@lru_cache(maxsize=1)
+def fetch_live_identity() -> tuple[Optional[dict[str, Any]], str]:
+    """Call sts get-caller-identity, at most once per run."""
     result = run_aws_command(["sts", "get-caller-identity", "--output", "json"])
     if not result.success:
-        print_error("Failed to get caller identity")
-        print(result.stderr)
-        print("\nCheck your credentials:")
-        print("  aws configure")
-        print("  aws configure --profile <profile-name>")
-        return False
+        return None, result.error
 
     try:
-        identity = json.loads(result.stdout)
-        print_success("Authenticated successfully")
-        print_info(f"Account:  {identity.get('Account', 'N/A')}")
-        print_info(f"ARN:      {identity.get('Arn', 'N/A')}")
-        print_info(f"User ID:  {identity.get('UserId', 'N/A')}")
+        identity = json_loads(result.stdout)
+    except json.JSONDecodeError:
+        return None, "Invalid JSON response from AWS CLI"
 
-        if profile := os.environ.get("AWS_PROFILE"):
-            print_info(f"Profile:  {profile}")
+    save_cached_identity(identity)
+    return identity, ""
 
-        region_result = run_aws_command(["configure", "get", "region"])
-        region = region_result.stdout.strip() if region_result.success else "not set"
-        print_info(f"Region:   {region}")
 
-        return True
-    except json.JSONDecodeError:
-        print_error("Invalid JSON response from AWS CLI")
+def fetch_identity(use_cache: bool = True) -> tuple[Optional[dict[str, Any]], str]:
+    """Return the caller identity and an error message.
+
+    With use_cache, a recent disk entry for the same credentials stands in
+    for the STS call; verifying credentials must pass use_cache=False.
+    """
+    if use_cache and fetch_live_identity.cache_info().currsize == 0:
+        if (identity := load_cached_identity()) is not None:
+            return identity, ""
+    return fetch_live_identity()
+
+
+@lru_cache(maxsize=1)
+def fetch_region() -> str:
+    result = run_aws_command(["configure", "get", "region"])
+    return result.stdout.strip().decode() if result.success else "not set"
+
+
+def check_identity(live: bool = False) -> bool:
+    print_header("AWS Identity")
+
+    identity, error = fetch_identity(use_cache=not live)
+    if identity is None:
+        print_error("Failed to get caller identity")
+        print(error)
+        print("\nCheck your credentials:")
+        print("  aws configure")
+        print("  aws configure --profile <profile-name>")
         return False
 
+    get = identity.get
+    print_success("Authenticated successfully")
+    print_info(f"Account:  {get('Account', 'N/A')}")
+    print_info(f"ARN:      {get('Arn', 'N/A')}")
+    print_info(f"User ID:  {get('UserId', 'N/A')}")
+
+    if profile := os.environ.get("AWS_PROFILE"):
+        print_info(f"Profile:  {profile}")
+
+    print_info(f"Region:   {fetch_region()}")
+
+    return True
+
+
+def run_probes(
+    tests: tuple[tuple[str, Probe], ...], known: Optional[dict[str, bool]] = None
+) -> dict[str, bool]:
+    outcomes = dict(known or {})
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+        futures = {
+            executor.submit(probe, test): permission
+            for permission, test in tests
+            if permission not in outcomes
+        }
+        for future in as_completed(futures):
+            outcomes[futures[future]] = future.result().success
+
+    return {permission: outcomes[permission] for permission, _ in tests}
+
+
+REQUIRED_PROBES: tuple[tuple[str, Probe], ...] = (
+    ("ecs:ListClusters", Probe(
+        ("ecs", "list-clusters", "--max-results", "1"),
+        "ecs", "list_clusters", {"maxResults": 1},
+    )),
+    ("ec2:DescribeInstances", Probe(
+        ("ec2", "describe-instances", "--max-results", "5"),
+        "ec2", "describe_instances", {"MaxResults": 5},
+    )),
+    ("ec2:DescribeRegions", Probe(
+        ("ec2", "describe-regions"),
+        "ec2", "describe_regions",
+    )),
+    ("lambda:ListFunctions", Probe(
+        ("lambda", "list-functions", "--max-items", "1"),
+        "lambda", "list_functions", {"MaxItems": 1},
+    )),
+    ("cloudwatch:DescribeAlarms", Probe(
+        ("cloudwatch", "describe-alarms", "--max-records", "1"),
+        "cloudwatch", "describe_alarms", {"MaxRecords": 1},
+    )),
+    ("cloudwatch:ListMetrics", Probe(
+        ("cloudwatch", "list-metrics", "--namespace", "AWS/EC2"),
+        "cloudwatch", "list_metrics", {"Namespace": "AWS/EC2"},
+    )),
+    ("rds:DescribeDBInstances", Probe(
+        ("rds", "describe-db-instances", "--max-records", "20"),
+        "rds", "describe_db_instances", {"MaxRecords": 20},
+    )),
+    ("elbv2:DescribeLoadBalancers", Probe(
+        ("elbv2", "describe-load-balancers", "--page-size", "1"),
+        "elbv2", "describe_load_balancers", {"PageSize": 1},
+    )),
+    ("s3:ListBuckets", Probe(
+        ("s3api", "list-buckets"),
+        "s3", "list_buckets",
+    )),
+    ("sts:GetCallerIdentity", Probe(
+        ("sts", "get-caller-identity"),
+        "sts", "get_caller_identity",
+    )),
+)
+
+OPTIONAL_PROBES: tuple[tuple[str, Probe], ...] = (
+    ("ce:GetCostAndUsage", Probe(
+        (
+            "ce", "get-cost-and-usage",
+            "--time-period", "Start=2024-01-01,End=2024-01-02",
+            "--granularity", "DAILY",
+            "--metrics", "BlendedCost",
+        ),
+        "ce", "get_cost_and_usage",
+        {
+            "TimePeriod": {"Start": "2024-01-01", "End": "2024-01-02"},
+            "Granularity": "DAILY",
+            "Metrics": ["BlendedCost"],
+        },
+    )),
+    ("securityhub:GetFindings", Probe(
+        ("securityhub", "get-findings", "--max-results", "1"),
+        "securityhub", "get_findings", {"MaxResults": 1},
+    )),
+    ("guardduty:ListDetectors", Probe(
+        ("guardduty", "list-detectors", "--max-results", "1"),
+        "guardduty", "list_detectors", {"MaxResults": 1},
+    )),
+    ("elasticbeanstalk:DescribeEnvironments", Probe(
+        ("elasticbeanstalk", "describe-environments", "--max-records", "1"),
+        "elasticbeanstalk", "describe_environments", {"MaxRecords": 1},
+    )),
+)
+
+# Permissions whose IAM action name differs from the label we print.
+IAM_ACTIONS = {
+    "elbv2:DescribeLoadBalancers": "elasticloadbalancing:DescribeLoadBalancers",
+    "s3:ListBuckets": "s3:ListAllMyBuckets",
+}
+
+
+def policy_source_arn(arn: str) -> str:
+    """Map an assumed-role session ARN back to its IAM role ARN."""
+    parts = arn.split(":", 5)
+    if len(parts) == 6 and parts[2] == "sts" and parts[5].startswith("assumed-role/"):
+        role = parts[5].split("/")[1]
+        return f"arn:{parts[1]}:iam::{parts[4]}:role/{role}"
+    return arn
+
+
+def simulate_permissions(actions: list[str]) -> Optional[dict[str, bool]]:
+    """Evaluate actions with the IAM policy simulator in one call.
+
+    Returns None when the simulator cannot be used, e.g. when the caller
+    lacks iam:SimulatePrincipalPolicy.
+    """
+    identity, _ = fetch_identity()
+    if not identity or "Arn" not in identity:
+        return None
+    source_arn = policy_source_arn(identity["Arn"])
+
+    if HAS_BOTO3:
+        try:
+            response = get_client("iam").simulate_principal_policy(
+                PolicySourceArn=source_arn, ActionNames=actions
+            )
+        except boto_errors():
+            return None
+        results = [(r["EvalActionName"], r["EvalDecision"]) for r in response["EvaluationResults"]]
+    else:
+        result = run_aws_command([
+            "iam", "simulate-principal-policy",
+            "--policy-source-arn", source_arn,
+            "--action-names", *actions,
+            "--query", "EvaluationResults[*].[EvalActionName,EvalDecision]",
+            "--output", "json",
+        ])
+        if not result.success:
+            return None
+        try:
+            results = json_loads(result.stdout)
+        except json.JSONDecodeError:
+            return None
 
-def check_permissions() -> bool:
-    print_header("Dash Monitoring Permissions")
-
-    required_tests = {
-        "ecs:ListClusters": ["ecs", "list-clusters", "--max-results", "1"],
-        "ec2:DescribeInstances": ["ec2", "describe-instances", "--max-results", "1"],
-        "ec2:DescribeRegions": ["ec2", "describe-regions", "--max-results", "1"],
-        "lambda:ListFunctions": ["lambda", "list-functions", "--max-items", "1"],
-        "cloudwatch:DescribeAlarms": ["cloudwatch", "describe-alarms", "--max-records", "1"],
-        "cloudwatch:ListMetrics": ["cloudwatch", "list-metrics", "--namespace", "AWS/EC2"],
-        "rds:DescribeDBInstances": ["rds", "describe-db-instances", "--max-records", "1"],
-        "elbv2:DescribeLoadBalancers": ["elbv2", "describe-load-balancers", "--page-size", "1"],
-        "s3:ListBuckets": ["s3api", "list-buckets"],
-        "sts:GetCallerIdentity": ["sts", "get-caller-identity"],
-    }
+    try:
+        decisions = {action.lower(): decision == "allowed" for action, decision in results}
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if any(action.lower() not in decisions for action in actions):
+        return None
+    return decisions
+
+
+def check_permissions(file: Optional[TextIO] = None, mode: str = "auto") -> bool:
+    out = io.StringIO()
+    print_header("Dash Monitoring Permissions", file=out)
+
+    outcomes = None
+    known: dict[str, bool] = {}
+    if mode != "probe":
+        actions = {permission: IAM_ACTIONS.get(permission, permission) for permission, _ in REQUIRED_PROBES}
+        decisions = simulate_permissions(list(actions.values()))
+        if decisions is not None:
+            print_info("Evaluated with the IAM policy simulator", file=out)
+            outcomes = {permission: decisions[action.lower()] for permission, action in actions.items()}
+            if mode == "auto":
+                # The simulator reports implicitDeny for policies with
+                # conditions it cannot evaluate (MFA, aws:SourceIp,
+                # aws:RequestedRegion, ...), so only its allows are trusted;
+                # everything else is confirmed with a live probe.
+                known = {permission: True for permission, ok in outcomes.items() if ok}
+                if len(known) < len(outcomes):
+                    print_info(f"Probing {len(outcomes) - len(known)} denied action(s) with live API calls", file=out)
+                    outcomes = None
+        elif mode == "simulate":
+            print_error("IAM policy simulation failed (requires iam:SimulatePrincipalPolicy)", file=out)
+            write_buffered(out, file)
+            return False
+
+    if outcomes is None:
+        # A cached identity proves nothing about the current credentials, so
+        # this is a live call unless one was already made this run.
+        known.setdefault("sts:GetCallerIdentity", fetch_live_identity()[0] is not None)
+        outcomes = run_probes(REQUIRED_PROBES, known)
 
     passed = 0
     failed = 0
 
-    for permission, cmd in required_tests.items():
-        result = run_aws_command(cmd)
-        if result.success:
-            print_success(permission)
+    for permission, ok in outcomes.items():
+        if ok:
+            print_success(permission, file=out)
             passed += 1
         else:
-            print_error(permission)
+            print_error(permission, file=out)
             failed += 1
 
-    print()
-
-    optional_tests = {
-        "ce:GetCostAndUsage": [
-            "ce", "get-cost-and-usage",
-            "--time-period", "Start=2024-01-01,End=2024-01-02",
-            "--granularity", "DAILY",
-            "--metrics", "BlendedCost",
-        ],
-        "securityhub:GetFindings": ["securityhub", "get-findings", "--max-results", "1"],
-        "guardduty:ListDetectors": ["guardduty", "list-detectors", "--max-results", "1"],
-        "elasticbeanstalk:DescribeEnvironments": [
-            "elasticbeanstalk", "describe-environments", "--max-records", "1"
-        ],
-    }
+    print(file=out)
 
-    print_info("Optional permissions (may require service activation):")
-    for permission, cmd in optional_tests.items():
-        result = run_aws_command(cmd)
-        if result.success:
-            print_success(permission)
+    print_info("Optional permissions (may require service activation):", file=out)
+    for permission, ok in run_probes(OPTIONAL_PROBES).items():
+        if ok:
+            print_success(permission, file=out)
         else:
-            print_warning(f"{permission} (not available or not enabled)")
+            print_warning(f"{permission} (not available or not enabled)", file=out)
 
-    print()
-    print(f"Required permissions: {passed} passed, {failed} failed")
+    print(file=out)
+    print(f"Required permissions: {passed} passed, {failed} failed", file=out)
+    write_buffered(out, file)
 
     return failed == 0
 
 
-def discover_services() -> None:
-    print_header("Service Discovery")
+def discover_ecs(out: TextIO, region: Optional[str] = None) -> None:
+    print("ECS Clusters:", file=out)
+    result = run_aws_command(
+        ["ecs", "list-clusters", "--query", "clusterArns[*]", "--output", "json"],
+        region=region,
+    )
+    if not result.success:
+        print_error("Failed to list ECS clusters", file=out)
+        return
+
+    try:
+        clusters = json_loads(result.stdout)
+    except json.JSONDecodeError:
+        print_error("Failed to parse ECS clusters response", file=out)
+        return
+
+    if not clusters:
+        print_warning("No ECS clusters found", file=out)
+        return
+
+    def list_services(cluster_arn: str) -> CommandResult:
+        return run_aws_command([
+            "ecs", "list-services",
+            "--cluster", cluster_arn,
+            "--query", "serviceArns[*]",
+            "--output", "json",
+        ], region=region)
+
+    with ThreadPoolExecutor(max_workers=min(CLUSTER_WORKERS, len(clusters))) as executor:
+        svc_results = list(executor.map(list_services, clusters))
+
+    try:
+        for cluster_arn, svc_result in zip(clusters, svc_results):
+            cluster_name = cluster_arn.split("/")[-1]
+            print_info(cluster_name, file=out)
+
+            if svc_result.success:
+                services = json_loads(svc_result.stdout)
+                for service_arn in services:
+                    service_name = service_arn.split("/")[-1]
+                    print(f"    - {service_name}", file=out)
+    except json.JSONDecodeError:
+        print_error("Failed to parse ECS services response", file=out)
 
-    print("ECS Clusters:")
-    result = run_aws_command(["ecs", "list-clusters", "--query", "clusterArns[*]", "--output", "json"])
-    if result.success:
-        try:
-            clusters = json.loads(result.stdout)
-            if clusters:
-                for cluster_arn in clusters:
-                    cluster_name = cluster_arn.split("/")[-1]
-                    print_info(cluster_name)
-
-                    svc_result = run_aws_command([
-                        "ecs", "list-services",
-                        "--cluster", cluster_arn,
-                        "--query", "serviceArns[*]",
-                        "--output", "json",
-                    ])
-                    if svc_result.success:
-                        services = json.loads(svc_result.stdout)
-                        for service_arn in services:
-                            service_name = service_arn.split("/")[-1]
-                            print(f"    - {service_name}")
-            else:
-                print_warning("No ECS clusters found")
-        except json.JSONDecodeError:
-            print_error("Failed to parse ECS clusters response")
-    else:
-        print_error("Failed to list ECS clusters")
 
-    print()
-    print("EC2 Instances (running):")
+def discover_ec2(out: TextIO, region: Optional[str] = None) -> None:
+    print("EC2 Instances (running):", file=out)
     result = run_aws_command([
         "ec2", "describe-instances",
         "--filters", "Name=instance-state-name,Values=running",
         "--query", "Reservations[*].Instances[*].[InstanceId,Tags[?Key==`Name`].Value|[0],InstanceType]",
         "--output", "json",
-    ])
+    ], region=region)
     if result.success:
         try:
-            reservations = json.loads(result.stdout)
-            instances = [inst for res in reservations for inst in res]
+            reservations = json_loads(result.stdout)
+            instances = list(chain.from_iterable(reservations))
             if instances:
                 for inst in instances:
                     instance_id, name, instance_type = inst
                     name = name or "unnamed"
-                    print_info(f"{instance_id} - {name} ({instance_type})")
+                    print_info(f"{instance_id} - {name} ({instance_type})", file=out)
             else:
-                print_warning("No running EC2 instances found")
+                print_warning("No running EC2 instances found", file=out)
         except json.JSONDecodeError:
-            print_error("Failed to parse EC2 instances response")
+            print_error("Failed to parse EC2 instances response", file=out)
     else:
-        print_error("Failed to describe EC2 instances")
+        print_error("Failed to describe EC2 instances", file=out)
+
 
-    print()
-    print("Lambda Functions:")
+def discover_lambda(out: TextIO, region: Optional[str] = None) -> None:
+    print("Lambda Functions:", file=out)
     result = run_aws_command([
         "lambda", "list-functions",
         "--query", "Functions[*].[FunctionName,Runtime]",
         "--output", "json",
-    ])
+    ], region=region)
     if result.success:
         try:
-            functions = json.loads(result.stdout)
+            functions = json_loads(result.stdout)
             if functions:
-                for i, func in enumerate(functions[:10]):
+                for func in functions[:10]:
                     name, runtime = func
-                    print_info(f"{name} ({runtime})")
+                    print_info(f"{name} ({runtime})", file=out)
                 if len(functions) > 10:
-                    print(f"    ... and {len(functions) - 10} more")
+                    print(f"    ... and {len(functions) - 10} more", file=out)
             else:
-                print_warning("No Lambda functions found")
+                print_warning("No Lambda functions found", file=out)
         except json.JSONDecodeError:
-            print_error("Failed to parse Lambda functions response")
+            print_error("Failed to parse Lambda functions response", file=out)
     else:
-        print_error("Failed to list Lambda functions")
+        print_error("Failed to list Lambda functions", file=out)
 
-    print()
-    print("Load Balancers:")
+
+def discover_load_balancers(out: TextIO, region: Optional[str] = None) -> None:
+    print("Load Balancers:", file=out)
     result = run_aws_command([
         "elbv2", "describe-load-balancers",
         "--query", "LoadBalancers[*].[LoadBalancerName,Type,State.Code]",
         "--output", "json",
-    ])
+    ], region=region)
     if result.success:
         try:
-            lbs = json.loads(result.stdout)
+            lbs = json_loads(result.stdout)
             if lbs:
                 for lb in lbs:
                     name, lb_type, state = lb
-                    print_info(f"{name} ({lb_type}) - {state}")
+                    print_info(f"{name} ({lb_type}) - {state}", file=out)
             else:
-                print_warning("No load balancers found")
+                print_warning("No load balancers found", file=out)
         except json.JSONDecodeError:
-            print_error("Failed to parse load balancers response")
+            print_error("Failed to parse load balancers response", file=out)
     else:
-        print_error("Failed to describe load balancers")
+        print_error("Failed to describe load balancers", file=out)
 
-    print()
-    print("RDS Instances:")
+
+def discover_rds(out: TextIO, region: Optional[str] = None) -> None:
+    print("RDS Instances:", file=out)
     result = run_aws_command([
         "rds", "describe-db-instances",
         "--query", "DBInstances[*].[DBInstanceIdentifier,Engine,DBInstanceStatus]",
         "--output", "json",
-    ])
+    ], region=region)
     if result.success:
         try:
-            dbs = json.loads(result.stdout)
+            dbs = json_loads(result.stdout)
             if dbs:
                 for db in dbs:
                     identifier, engine, status = db
-                    print_info(f"{identifier} ({engine}) - {status}")
+                    print_info(f"{identifier} ({engine}) - {status}", file=out)
             else:
-                print_warning("No RDS instances found")
+                print_warning("No RDS instances found", file=out)
         except json.JSONDecodeError:
-            print_error("Failed to parse RDS instances response")
+            print_error("Failed to parse RDS instances response", file=out)
     else:
-        print_error("Failed to describe RDS instances")
+        print_error("Failed to describe RDS instances", file=out)
+
+
+DISCOVERY_SECTIONS = (
+    discover_ecs,
+    discover_ec2,
+    discover_lambda,
+    discover_load_balancers,
+    discover_rds,
+)
 
 
-def show_config() -> None:
-    print_header("AWS Configuration")
+def discover_services(region: Optional[str] = None, file: Optional[TextIO] = None) -> None:
+    out = io.StringIO()
+    print_header(f"Service Discovery ({region})" if region else "Service Discovery", file=out)
+
+    def render(section: Callable[[TextIO, Optional[str]], None]) -> str:
+        buf = io.StringIO()
+        section(buf, region)
+        return buf.getvalue()
+
+    # Sections share no data, so query them all at once and print the
+    # buffered output in the usual order.
+    with ThreadPoolExecutor(max_workers=len(DISCOVERY_SECTIONS)) as executor:
+        outputs = list(executor.map(render, DISCOVERY_SECTIONS))
+
+    out.write("\n".join(outputs))
+    write_buffered(out, file)
+
+
+def discover_all_regions(file: Optional[TextIO] = None) -> bool:
+    result = run_aws_command([
+        "ec2", "describe-regions",
+        "--query", "Regions[*].RegionName",
+        "--output", "json",
+    ])
+    if not result.success:
+        print_error(f"Failed to list regions: {result.error}", file=file)
+        return False
+
+    try:
+        regions = json_loads(result.stdout)
+    except json.JSONDecodeError:
+        print_error("Failed to parse regions response", file=file)
+        return False
+
+    if not regions:
+        print_warning("No enabled regions found", file=file)
+        return True
+
+    def render(region: str) -> str:
+        buf = io.StringIO()
+        discover_services(region, file=buf)
+        return buf.getvalue()
+
+    with ThreadPoolExecutor(max_workers=min(REGION_WORKERS, len(regions))) as executor:
+        outputs = list(executor.map(render, regions))
+
+    (file or sys.stdout).write("".join(outputs))
+    return True
+
+
+_PROFILE_RE = re.compile(r"^\[(?:profile\s+)?([^\]]+)\]\s*$")
+
+
+def read_profiles(path: Path) -> list[str]:
+    parser = configparser.RawConfigParser()
+    try:
+        parser.read(path)
+        return [name.removeprefix("profile ") for name in parser.sections()]
+    except configparser.Error:
+        pass
+
+    # configparser rejects some files the AWS CLI tolerates (duplicate
+    # sections, stray lines before the first header), so just scan headers.
+    with open(path) as f:
+        return [m.group(1) for line in f if (m := _PROFILE_RE.match(line.strip()))]
+
+
+def show_config(file: Optional[TextIO] = None) -> None:
+    out = io.StringIO()
+    print_header("AWS Configuration", file=out)
 
     config_path = Path.home() / ".aws" / "config"
     credentials_path = Path.home() / ".aws" / "credentials"
 
-    print("Configuration files:")
+    print("Configuration files:", file=out)
     if config_path.exists():
-        print_success("~/.aws/config exists")
-        print("  Profiles:")
-        with open(config_path) as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("["):
-                    profile = line.replace("[profile ", "").replace("[", "").replace("]", "")
-                    print(f"  - {profile}")
+        print_success("~/.aws/config exists", file=out)
+        print("  Profiles:", file=out)
+        for profile in read_profiles(config_path):
+            print(f"  - {profile}", file=out)
     else:
-        print_warning("~/.aws/config not found")
+        print_warning("~/.aws/config not found", file=out)
 
-    print()
+    print(file=out)
     if credentials_path.exists():
-        print_success("~/.aws/credentials exists")
-        print("  Profiles:")
-        with open(credentials_path) as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("["):
-                    profile = line.replace("[", "").replace("]", "")
-                    print(f"  - {profile}")
+        print_success("~/.aws/credentials exists", file=out)
+        print("  Profiles:", file=out)
+        for profile in read_profiles(credentials_path):
+            print(f"  - {profile}", file=out)
     else:
-        print_warning("~/.aws/credentials not found")
+        print_warning("~/.aws/credentials not found", file=out)
 
-    print()
-    print("Environment variables:")
+    print(file=out)
+    print("Environment variables:", file=out)
     env_vars = {
         "AWS_PROFILE": os.environ.get("AWS_PROFILE"),
         "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION"),
@@ -373,12 +859,37 @@ def show_config() -> None:
 
     for var, value in env_vars.items():
         if value:
-            print_info(f"{var}={value}")
+            print_info(f"{var}={value}", file=out)
         else:
-            print_warning(f"{var} not set")
+            print_warning(f"{var} not set", file=out)
+
+    write_buffered(out, file)
+
+
+class Command(NamedTuple):
+    needs_cli: bool
+    needs_identity: bool
+    steps: list[Callable[..., Optional[bool]]]
+    # Whether a failing step (one returning False) fails the whole command.
+    check_steps: bool = True
+    # Whether the identity check must call STS rather than trust the cache.
+    live_identity: bool = False
+
+
+COMMANDS = {
+    "all": Command(
+        True, True, [show_config, check_permissions, discover_services], check_steps=False, live_identity=True
+    ),
+    "identity": Command(True, True, [], live_identity=True),
+    "permissions": Command(True, True, [check_permissions]),
+    "services": Command(True, True, [discover_services]),
+    "config": Command(True, False, [show_config]),
+}
 
 
 def main() -> int:
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="AWS CLI Check - Verify AWS CLI setup for dash monitoring",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -387,6 +898,8 @@ Examples:
     %(prog)s                    # Run all checks
     %(prog)s identity           # Just check identity
     %(prog)s permissions        # Test dash permissions
+    %(prog)s permissions --mode probe  # Test with live API calls only
+    %(prog)s services --all-regions  # Discover services in every region
 
 Environment Variables:
     AWS_PROFILE             AWS profile to use
@@ -397,42 +910,54 @@ Environment Variables:
         "command",
         nargs="?",
         default="all",
-        choices=["all", "identity", "permissions", "services", "config"],
+        choices=list(COMMANDS),
         help="Command to run (default: all)",
     )
+    parser.add_argument(
+        "--all-regions",
+        action="store_true",
+        help="Discover services in every enabled region",
+    )
+    parser.add_argument(
+        "--mode",
+        default="auto",
+        choices=["auto", "simulate", "probe"],
+        help="How to check permissions: IAM policy simulator, live API probes, "
+        "or simulator with probe fallback (default: auto)",
+    )
 
     args = parser.parse_args()
+    command = COMMANDS[args.command]
 
-    if args.command == "all":
-        if not check_cli_installed():
-            return 1
-        if not check_identity():
-            return 1
-        show_config()
-        check_permissions()
-        discover_services()
-    elif args.command == "identity":
-        if not check_cli_installed():
-            return 1
-        if not check_identity():
-            return 1
-    elif args.command == "permissions":
-        if not check_cli_installed():
-            return 1
-        if not check_identity():
-            return 1
-        if not check_permissions():
-            return 1
-    elif args.command == "services":
-        if not check_cli_installed():
-            return 1
-        if not check_identity():
-            return 1
-        discover_services()
-    elif args.command == "config":
-        if not check_cli_installed():
-            return 1
-        show_config()
+    if command.needs_cli and not check_cli_installed():
+        return 1
+    if command.needs_identity and not check_identity(live=command.live_identity):
+        return 1
+
+    overrides = {
+        check_permissions: partial(check_permissions, mode=args.mode),
+        discover_services: discover_all_regions if args.all_regions else discover_services,
+    }
+    steps = [overrides.get(step, step) for step in command.steps]
+    if not steps:
+        return 0
+
+    def run_step(step: Callable[..., Optional[bool]]) -> tuple[Optional[bool], str]:
+        buf = io.StringIO()
+        ok = step(file=buf)
+        return ok, buf.getvalue()
+
+    # Steps only read local files or query AWS, so they can overlap; their
+    # output is still printed in table order.
+    with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+        results = list(executor.map(run_step, steps))
+
+    for _, output in results:
+        sys.stdout.write(output)
+    sys.stdout.flush()
+
+    if command.check_steps and any(ok is False for ok, _ in results):
+        return 1
 
     return 0
 
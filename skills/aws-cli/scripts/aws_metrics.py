@@ -17,17 +17,43 @@ Commands:
     ec2 <instance-id> [hours]           Get EC2 instance metrics
     rds <db-identifier> [hours]         Get RDS instance metrics
     export [output-file] [hours]        Export metrics to JSON
+    repl                                Run commands interactively
 """
 
 import argparse
+import hashlib
+import importlib.util
 import json
+import os
+import re
 import subprocess
 import sys
 import tempfile
+import time
+from collections import Counter
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+# boto3 takes ~100 ms to import, so it is only located here and imported on
+# first use; --help, export and the CLI fallback never pay for it.
+HAS_BOTO3 = importlib.util.find_spec("boto3") is not None
+
+try:
+    # orjson parses and serializes large listings and exports noticeably faster.
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=format_value).decode()
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj: Any) -> str:
+        return json.dumps(obj, default=format_value)
 
 
 class Colors:
@@ -39,46 +65,86 @@ class Colors:
     NC = "\033[0m"
 
 
+# Plain output when piped or when NO_COLOR is set (https://no-color.org).
+if os.environ.get("NO_COLOR") or not sys.stdout.isatty():
+    for _name in ("RED", "GREEN", "YELLOW", "BLUE", "CYAN", "NC"):
+        setattr(Colors, _name, "")
+
+_HEADER_BAR = f"{Colors.BLUE}{'━' * 60}{Colors.NC}"
+_OK = f"{Colors.GREEN}✓{Colors.NC} "
+_ERR = f"{Colors.RED}✗{Colors.NC} "
+_WARN = f"{Colors.YELLOW}!{Colors.NC} "
+_INFO = f"{Colors.BLUE}→{Colors.NC} "
+
+
 DEFAULT_PERIOD = 300
 DEFAULT_HOURS = 1
 
+_UTC = timezone.utc
+
+# Read-only listing calls (list-metrics, describe-alarms, ...) are cached on
+# disk for CACHE_TTL seconds so repeated runs skip the network.
+CACHE_TTL = 300
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "aws_metrics"
+
+# Throttling (ThrottlingException, "Rate exceeded") is the usual failure when
+# many metrics are fetched; both boto3 and the CLI retry with adaptive
+# client-side rate limiting.
+MAX_ATTEMPTS = 10
+AWS_ENV = {"AWS_RETRY_MODE": "adaptive", "AWS_MAX_ATTEMPTS": str(MAX_ATTEMPTS), **os.environ}
+
+# "An error occurred (ThrottlingException) when calling the GetMetricData operation: Rate exceeded"
+_CLI_ERROR_RE = re.compile(r"An error occurred \((?P<code>[^)]+)\)[^:]*: (?P<message>.*)", re.DOTALL)
+
+# Alarm listings longer than this are printed page by page.
+STREAM_ALARM_ROWS = 10_000
+
+# Linux caps a single argv entry at 128 KiB; larger CLI input goes via a file.
+MAX_INLINE_JSON = 100_000
+
 
 def print_header(text: str) -> None:
-    print(f"\n{Colors.BLUE}{'━' * 60}{Colors.NC}")
-    print(f"{Colors.BLUE}  {text}{Colors.NC}")
-    print(f"{Colors.BLUE}{'━' * 60}{Colors.NC}\n")
+    sys.stdout.write(
+        "\n" + _HEADER_BAR + "\n" + Colors.BLUE + "  " + text + Colors.NC + "\n" + _HEADER_BAR + "\n\n"
+    )
 
 
 def print_success(text: str) -> None:
-    print(f"{Colors.GREEN}✓{Colors.NC} {text}")
+    sys.stdout.write(_OK + text + "\n")
 
 
 def print_error(text: str) -> None:
-    print(f"{Colors.RED}✗{Colors.NC} {text}")
+    sys.stdout.write(_ERR + text + "\n")
 
 
 def print_warning(text: str) -> None:
-    print(f"{Colors.YELLOW}!{Colors.NC} {text}")
+    sys.stdout.write(_WARN + text + "\n")
 
 
 def print_info(text: str) -> None:
-    print(f"{Colors.BLUE}→{Colors.NC} {text}")
+    sys.stdout.write(_INFO + text + "\n")
 
 
 @dataclass
 class CommandResult:
     success: bool
-    stdout: str
-    stderr: str
+    stdout: bytes
+    stderr: bytes
     returncode: int
 
+    @property
+    def error(self) -> str:
+        return self.stderr.decode(errors="replace").strip()
+
 
 def run_aws_command(args: list[str], timeout: int = 60) -> CommandResult:
+    # Output stays bytes: JSON parsers take bytes directly, so only error
+    # text is ever decoded.
     try:
         result = subprocess.run(
             ["aws"] + args,
             capture_output=True,
-            text=True,
+            env=AWS_ENV,
             timeout=timeout,
         )
         return CommandResult(
@@ -90,29 +156,384 @@ def run_aws_command(args: list[str], timeout: int = 60) -> CommandResult:
     except subprocess.TimeoutExpired:
         return CommandResult(
             success=False,
-            stdout="",
-            stderr="Command timed out",
+            stdout=b"",
+            stderr=b"Command timed out",
             returncode=-1,
         )
     except FileNotFoundError:
         return CommandResult(
             success=False,
-            stdout="",
-            stderr="AWS CLI not found",
+            stdout=b"",
+            stderr=b"AWS CLI not found",
             returncode=-1,
         )
 
 
-def get_time_range(hours: int) -> tuple[str, str]:
-    end_time = datetime.now(timezone.utc)
-    start_time = end_time - timedelta(hours=hours)
-    return (
-        start_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        end_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+def get_time_range(hours: int) -> tuple[datetime, datetime]:
+    # boto3 takes datetimes directly; the CLI fallback serializes them.
+    end_time = datetime.now(_UTC).replace(microsecond=0)
+    return end_time - timedelta(hours=hours), end_time
+
+
+class AwsError(Exception):
+    """An AWS API call failed; code is the AWS error code, when one was returned."""
+
+    def __init__(self, message: str, code: Optional[str] = None) -> None:
+        super().__init__(f"{code}: {message}" if code else message)
+        self.code = code
+
+    @classmethod
+    def from_botocore(cls, e: Exception) -> "AwsError":
+        from botocore.exceptions import ClientError
+
+        if isinstance(e, ClientError):
+            error = e.response.get("Error", {})
+            return cls(error.get("Message") or str(e), error.get("Code"))
+        return cls(str(e))
+
+    @classmethod
+    def from_cli(cls, stderr: str) -> "AwsError":
+        match = _CLI_ERROR_RE.search(stderr)
+        if match:
+            return cls(match["message"].strip(), match["code"])
+        return cls(stderr.strip())
+
+
+@lru_cache(maxsize=1)
+def boto_errors() -> tuple[type[Exception], ...]:
+    """The botocore exceptions a failed API call raises."""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    return BotoCoreError, ClientError
+
+
+@lru_cache(maxsize=1)
+def get_session() -> Any:
+    # Created on first use, inside the callers' botocore error handling, so
+    # e.g. an unknown AWS_PROFILE surfaces as AwsError rather than at import.
+    import boto3
+
+    return boto3.Session()
+
+
+@lru_cache(maxsize=None)
+def get_client(service: str) -> Any:
+    """One client per service, so every call reuses its keep-alive connection pool."""
+    from botocore.config import Config
+
+    return get_session().client(
+        service,
+        config=Config(
+            retries={"mode": "adaptive", "total_max_attempts": MAX_ATTEMPTS},
+            max_pool_connections=16,
+            tcp_keepalive=True,
+        ),
     )
 
 
-def list_metrics(namespace: Optional[str] = None) -> int:
+def call_aws(service: str, operation: str, **params: Any) -> dict[str, Any]:
+    """Call an AWS API operation and return the full (all pages) response.
+
+    Uses boto3 in-process when it is installed. Otherwise the same request
+    is sent through the aws CLI with --cli-input-json, which auto-paginates
+    the same way.
+    """
+    if HAS_BOTO3:
+        try:
+            client = get_client(service)
+            if client.can_paginate(operation):
+                response = client.get_paginator(operation).paginate(**params).build_full_result()
+            else:
+                response = getattr(client, operation)(**params)
+        except boto_errors() as e:
+            raise AwsError.from_botocore(e) from e
+        response.pop("ResponseMetadata", None)
+        return response
+
+    cli_input = json_dumps(params)
+    command = [service, operation.replace("_", "-"), "--cli-input-json", cli_input, "--output", "json"]
+    if len(cli_input) < MAX_INLINE_JSON:
+        result = run_aws_command(command, timeout=120)
+    else:
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+            f.write(cli_input)
+        command[3] = f"file://{f.name}"
+        try:
+            result = run_aws_command(command, timeout=120)
+        finally:
+            Path(f.name).unlink(missing_ok=True)
+
+    if not result.success:
+        raise AwsError.from_cli(result.error)
+    try:
+        return json_loads(result.stdout) if result.stdout.strip() else {}
+    except json.JSONDecodeError as e:
+        raise AwsError(f"Invalid JSON response from AWS CLI: {e}") from e
+
+
+def iter_pages(service: str, operation: str, **params: Any) -> Iterator[dict[str, Any]]:
+    """Yield response pages as they arrive.
+
+    The aws CLI merges pages itself, so without boto3 this yields one page.
+    """
+    if not HAS_BOTO3:
+        yield call_aws(service, operation, **params)
+        return
+
+    try:
+        client = get_client(service)
+        if client.can_paginate(operation):
+            yield from client.get_paginator(operation).paginate(**params)
+        else:
+            yield getattr(client, operation)(**params)
+    except boto_errors() as e:
+        raise AwsError.from_botocore(e) from e
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _cached(key: str, ttl: float, fn: Callable[[], dict[str, Any]]) -> dict[str, Any]:
+    """Return fn() through a JSON file cache keyed by key; ttl <= 0 bypasses it."""
+    if ttl <= 0:
+        return fn()
+
+    path = CACHE_DIR / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+    try:
+        if time.time() - path.stat().st_mtime < ttl:
+            return json_loads(path.read_bytes())
+    except (OSError, ValueError):
+        pass
+
+    result = fn()
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=CACHE_DIR, suffix=".tmp", delete=False
+        ) as f:
+            f.write(json_dumps(result))
+        os.replace(f.name, path)
+    except OSError:
+        pass
+    return result
+
+
+def _cache_scope() -> list[Optional[str]]:
+    """What a cached response depends on besides the request: profile, credentials and region."""
+    region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION")
+    if HAS_BOTO3:
+        # The session also sees the region set in ~/.aws/config.
+        try:
+            region = get_session().region_name
+        except boto_errors():
+            pass
+    env_vars = ("AWS_PROFILE", "AWS_DEFAULT_PROFILE", "AWS_ACCESS_KEY_ID", "AWS_SESSION_TOKEN")
+    return [*(os.environ.get(var) for var in env_vars), region]
+
+
+def cached_call(service: str, operation: str, ttl: float = CACHE_TTL, **params: Any) -> dict[str, Any]:
+    """call_aws for read-only operations, cached per profile, credentials and region.
+
+    The key is only ever stored as its SHA-256, so credentials never reach disk.
+    """
+    key = json.dumps([*_cache_scope(), service, operation, params], sort_keys=True)
+    return _cached(key, ttl, lambda: call_aws(service, operation, **params))
+
+
+def format_table(headers: list[str], rows: list[tuple]) -> str:
+    """Render rows as aligned columns; numeric columns are right-aligned."""
+    cells = [[format_value(v) for v in row] for row in rows]
+    widths = [len(h) for h in headers]
+    for row in cells:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], len(cell))
+    numeric = [
+        all(row[i] is None or isinstance(row[i], (int, float)) for row in rows)
+        and any(row[i] is not None for row in rows)
+        for i in range(len(headers))
+    ]
+
+    def align(values: list[str]) -> str:
+        return "  ".join(
+            v.rjust(w) if num else v.ljust(w) for v, w, num in zip(values, widths, numeric)
+        )
+
+    lines = [align(headers), "  ".join("-" * w for w in widths)]
+    lines.extend(align(row) for row in cells)
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def print_table(headers: list[str], rows: list[tuple]) -> None:
+    if rows:
+        print(format_table(headers, rows))
+    else:
+        print("  (no data)")
+
+
+def datapoint_rows(response: dict[str, Any], stats: list[str]) -> list[tuple]:
+    datapoints = sorted(response.get("Datapoints", []), key=lambda d: d["Timestamp"])
+    return [(d["Timestamp"], *(d.get(stat) for stat in stats)) for d in datapoints]
+
+
+class MetricsBatch:
+    """Collects GetMetricData queries and fetches them in as few calls as possible."""
+
+    MAX_QUERIES = 500  # GetMetricData limit per request
+
+    def __init__(self) -> None:
+        self.queries: list[dict[str, Any]] = []
+        self.messages: list[dict[str, Any]] = []
+
+    def add(
+        self,
+        namespace: str,
+        metric: str,
+        dimensions: Optional[list[dict[str, str]]] = None,
+        stat: str = "Average",
+        period: int = DEFAULT_PERIOD,
+        query_id: Optional[str] = None,
+    ) -> str:
+        """Queue a query and return its Id."""
+        query_id = query_id or f"m{len(self.queries)}"
+        self.queries.append({
+            "Id": query_id,
+            "MetricStat": {
+                "Metric": {"Namespace": namespace, "MetricName": metric, "Dimensions": dimensions or []},
+                "Period": period,
+                "Stat": stat,
+            },
+            "ReturnData": True,
+        })
+        return query_id
+
+    def stream(self, start_time: datetime, end_time: datetime) -> Iterator[dict[str, Any]]:
+        """Fetch every queued query, yielding MetricDataResults entries page by page.
+
+        A query whose datapoints span several pages yields one entry per page.
+        """
+        queries, self.queries = self.queries, []
+        for i in range(0, len(queries), self.MAX_QUERIES):
+            for page in iter_pages(
+                "cloudwatch", "get_metric_data",
+                MetricDataQueries=queries[i:i + self.MAX_QUERIES],
+                StartTime=start_time,
+                EndTime=end_time,
+                ScanBy="TimestampAscending",
+            ):
+                self.messages.extend(page.get("Messages", []))
+                yield from page.get("MetricDataResults", [])
+
+    def flush(self, start_time: datetime, end_time: datetime) -> dict[str, dict[str, Any]]:
+        """Fetch every queued query; results are keyed by Id in the order added."""
+        results: dict[str, dict[str, Any]] = {
+            q["Id"]: {"Id": q["Id"], "Label": q["MetricStat"]["Metric"]["MetricName"],
+                      "Timestamps": [], "Values": []}
+            for q in self.queries
+        }
+        # Merge the per-page entries back into one result per Id.
+        for result in self.stream(start_time, end_time):
+            merged = results[result["Id"]]
+            merged["Label"] = result.get("Label", merged["Label"])
+            merged["Timestamps"].extend(result.get("Timestamps", []))
+            merged["Values"].extend(result.get("Values", []))
+            merged["StatusCode"] = result.get("StatusCode")
+        return results
+
+
+def fetch_metrics(
+    namespace: str,
+    dimensions: list[dict[str, str]],
+    metrics: list[tuple[str, str, str]],
+    start_time: datetime,
+    end_time: datetime,
+) -> list[dict[str, Any]]:
+    """Fetch (metric, label, stat) entries in one batch, in input order."""
+    batch = MetricsBatch()
+    ids = [batch.add(namespace, metric, dimensions, stat) for metric, _, stat in metrics]
+    results = batch.flush(start_time, end_time)
+    return [results[query_id] for query_id in ids]
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """The metrics shown for one resource type, keyed in METRIC_SPECS."""
+
+    title: str
+    namespace: str
+    dimensions: tuple[str, ...]  # dimension names, filled from the command's identifiers
+    metrics: tuple[tuple[str, str, str], ...]  # (metric, label, stat)
+
+
+METRIC_SPECS = {
+    "ecs": MetricSpec(
+        "ECS Metrics",
+        "AWS/ECS",
+        ("ClusterName", "ServiceName"),
+        (
+            ("CPUUtilization", "CPU Utilization", "Average"),
+            ("MemoryUtilization", "Memory Utilization", "Average"),
+        ),
+    ),
+    "ec2": MetricSpec(
+        "EC2 Metrics",
+        "AWS/EC2",
+        ("InstanceId",),
+        (
+            ("CPUUtilization", "CPU Utilization", "Average"),
+            ("NetworkIn", "Network In (bytes)", "Sum"),
+            ("NetworkOut", "Network Out (bytes)", "Sum"),
+        ),
+    ),
+    "rds": MetricSpec(
+        "RDS Metrics",
+        "AWS/RDS",
+        ("DBInstanceIdentifier",),
+        (
+            ("CPUUtilization", "CPU Utilization", "Average"),
+            ("DatabaseConnections", "Database Connections", "Average"),
+            ("FreeStorageSpace", "Free Storage Space (bytes)", "Average"),
+        ),
+    ),
+}
+
+
+def show_metrics(spec: MetricSpec, identifiers: list[str], hours: int) -> int:
+    start_time, end_time = get_time_range(hours)
+    dimensions = [{"Name": name, "Value": value} for name, value in zip(spec.dimensions, identifiers)]
+    metrics = list(spec.metrics)
+    try:
+        results = fetch_metrics(spec.namespace, dimensions, metrics, start_time, end_time)
+    except AwsError as e:
+        print_error(f"Failed to get metrics: {e}")
+        return 1
+
+    for (_, label, stat), result in zip(metrics, results):
+        rows = list(zip(result["Timestamps"], result["Values"]))[-5:]
+        if rows:
+            print(f"{label}:")
+            print_table(["Timestamp", stat], rows)
+        else:
+            print_warning(f"No data for {label} in the last {hours}h")
+        print()
+
+    return 0
+
+
+def get_service_metrics(kind: str, identifier: str, hours: int = DEFAULT_HOURS) -> int:
+    """Show the METRIC_SPECS[kind] metrics for a single-dimension resource."""
+    spec = METRIC_SPECS[kind]
+    print_header(f"{spec.title}: {identifier}")
+    return show_metrics(spec, [identifier], hours)
+
+
+def list_metrics(namespace: Optional[str] = None, cache_ttl: float = CACHE_TTL) -> int:
     print_header("CloudWatch Metrics")
 
     if not namespace:
@@ -139,19 +560,18 @@ def list_metrics(namespace: Optional[str] = None) -> int:
     print_info(f"Listing metrics in namespace: {namespace}")
     print()
 
-    result = run_aws_command([
-        "cloudwatch", "list-metrics",
-        "--namespace", namespace,
-        "--query", "Metrics[*].[MetricName,Dimensions[0].Name,Dimensions[0].Value]",
-        "--output", "table",
-    ])
-
-    if result.success:
-        print(result.stdout)
-    else:
-        print_error(f"Failed to list metrics: {result.stderr}")
+    try:
+        response = cached_call("cloudwatch", "list_metrics", cache_ttl, Namespace=namespace)
+    except AwsError as e:
+        print_error(f"Failed to list metrics: {e}")
         return 1
 
+    rows = []
+    for metric in response.get("Metrics", []):
+        dimension = (metric.get("Dimensions") or [{}])[0]
+        rows.append((metric["MetricName"], dimension.get("Name"), dimension.get("Value")))
+    print_table(["Metric", "Dimension", "Value"], rows)
+
     return 0
 
 
@@ -169,80 +589,81 @@ def get_metric(
 
     print_info(f"Namespace: {namespace}")
     print_info(f"Period: {period}s")
-    print_info(f"Time range: {start_time} to {end_time}")
-
-    cmd = [
-        "cloudwatch", "get-metric-statistics",
-        "--namespace", namespace,
-        "--metric-name", metric_name,
-        "--start-time", start_time,
-        "--end-time", end_time,
-        "--period", str(period),
-        "--statistics", "Average", "Minimum", "Maximum",
-        "--query", "sort_by(Datapoints, &Timestamp)[*].[Timestamp,Average,Minimum,Maximum]",
-        "--output", "table",
-    ]
+    print_info(f"Time range: {start_time.isoformat()} to {end_time.isoformat()}")
+
+    params = {
+        "Namespace": namespace,
+        "MetricName": metric_name,
+        "StartTime": start_time,
+        "EndTime": end_time,
+        "Period": period,
+        "Statistics": ["Average", "Minimum", "Maximum"],
+    }
 
     if dimension_name and dimension_value:
-        cmd.extend(["--dimensions", f"Name={dimension_name},Value={dimension_value}"])
+        params["Dimensions"] = [{"Name": dimension_name, "Value": dimension_value}]
         print_info(f"Dimension: {dimension_name}={dimension_value}")
 
     print()
 
-    result = run_aws_command(cmd)
-    if result.success:
-        print(result.stdout)
-    else:
-        print_error(f"Failed to get metric: {result.stderr}")
+    try:
+        response = call_aws("cloudwatch", "get_metric_statistics", **params)
+    except AwsError as e:
+        print_error(f"Failed to get metric: {e}")
         return 1
 
+    stats = ["Average", "Minimum", "Maximum"]
+    print_table(["Timestamp", *stats], datapoint_rows(response, stats))
+
     return 0
 
 
-def list_alarms(state: Optional[str] = None) -> int:
+def list_alarms(state: Optional[str] = None, cache_ttl: float = 0) -> int:
     print_header("CloudWatch Alarms")
 
     if state:
         print_info(f"Filtering by state: {state}")
 
-    cmd = [
-        "cloudwatch", "describe-alarms",
-        "--query", "MetricAlarms[*].[AlarmName,StateValue,MetricName,Namespace]",
-        "--output", "table",
-    ]
-
-    if state:
-        cmd.extend(["--state-value", state])
-
     print()
 
-    result = run_aws_command(cmd)
-    if result.success:
-        print(result.stdout)
-    else:
-        print_error(f"Failed to list alarms: {result.stderr}")
+    # One unfiltered sweep feeds both the table and the per-state summary;
+    # the state filter is applied locally. Uncached sweeps are read page by
+    # page, and past STREAM_ALARM_ROWS rows the table is printed per page
+    # rather than held in memory.
+    headers = ["Alarm", "State", "Metric", "Namespace"]
+    counts: Counter[str] = Counter()
+    rows: list[tuple] = []
+    streaming = False
+    try:
+        if cache_ttl > 0:
+            pages: Iterable[dict[str, Any]] = [cached_call("cloudwatch", "describe_alarms", cache_ttl)]
+        else:
+            pages = iter_pages("cloudwatch", "describe_alarms")
+        for page in pages:
+            for a in page.get("MetricAlarms", []):
+                counts[a["StateValue"]] += 1
+                if not state or a["StateValue"] == state:
+                    rows.append((a["AlarmName"], a["StateValue"], a.get("MetricName"), a.get("Namespace")))
+            if rows and (streaming or len(rows) > STREAM_ALARM_ROWS):
+                print(format_table(headers, rows))
+                rows.clear()
+                streaming = True
+    except AwsError as e:
+        print_error(f"Failed to list alarms: {e}")
         return 1
 
-    print()
+    if rows or not streaming:
+        print_table(headers, rows)
 
-    counts = {}
-    for s in ["ALARM", "OK", "INSUFFICIENT_DATA"]:
-        count_result = run_aws_command([
-            "cloudwatch", "describe-alarms",
-            "--state-value", s,
-            "--query", "length(MetricAlarms)",
-            "--output", "text",
-        ])
-        counts[s] = count_result.stdout.strip() if count_result.success else "?"
+    print()
 
     print("Summary:")
-    alarm_count = counts.get("ALARM", "0")
-    if alarm_count != "0":
-        print(f"  {Colors.RED}ALARM: {alarm_count}{Colors.NC}")
+    if counts["ALARM"]:
+        print(f"  {Colors.RED}ALARM: {counts['ALARM']}{Colors.NC}")
     else:
-        print(f"  ALARM: 0")
-    print(f"  OK: {counts.get('OK', '?')}")
-    print(f"  INSUFFICIENT_DATA: {counts.get('INSUFFICIENT_DATA', '?')}")
+        print("  ALARM: 0")
+    print(f"  OK: {counts['OK']}")
+    print(f"  INSUFFICIENT_DATA: {counts['INSUFFICIENT_DATA']}")
 
     return 0
 
@@ -250,26 +671,15 @@ def list_alarms(state: Optional[str] = None) -> int:
 def get_ecs_metrics(cluster: str, service: Optional[str] = None, hours: int = DEFAULT_HOURS) -> int:
     print_header(f"ECS Metrics: {cluster}")
 
-    start_time, end_time = get_time_range(hours)
-
     if not service:
         print("Services in cluster:")
-        result = run_aws_command([
-            "ecs", "list-services",
-            "--cluster", cluster,
-            "--query", "serviceArns[*]",
-            "--output", "json",
-        ])
-        if result.success:
-            try:
-                services = json.loads(result.stdout)
-                for svc_arn in services:
-                    svc_name = svc_arn.split("/")[-1]
-                    print(f"  - {svc_name}")
-            except json.JSONDecodeError:
-                print_error("Failed to parse services response")
-        else:
-            print_error(f"Failed to list services: {result.stderr}")
+        try:
+            response = cached_call("ecs", "list_services", cluster=cluster)
+            for svc_arn in response.get("serviceArns", []):
+                svc_name = svc_arn.split("/")[-1]
+                print(f"  - {svc_name}")
+        except AwsError as e:
+            print_error(f"Failed to list services: {e}")
         print()
         print(f"Usage: aws_metrics.py ecs {cluster} <service-name>")
         return 0
@@ -277,97 +687,7 @@ def get_ecs_metrics(cluster: str, service: Optional[str] = None, hours: int = DE
     print_info(f"Service: {service}")
     print()
 
-    for metric, label in [("CPUUtilization", "CPU Utilization"), ("MemoryUtilization", "Memory Utilization")]:
-        print(f"{label}:")
-        result = run_aws_command([
-            "cloudwatch", "get-metric-statistics",
-            "--namespace", "AWS/ECS",
-            "--metric-name", metric,
-            "--dimensions",
-            f"Name=ClusterName,Value={cluster}",
-            f"Name=ServiceName,Value={service}",
-            "--start-time", start_time,
-            "--end-time", end_time,
-            "--period", "300",
-            "--statistics", "Average",
-            "--query", "sort_by(Datapoints, &Timestamp)[-5:].[Timestamp,Average]",
-            "--output", "table",
-        ])
-        if result.success:
-            print(result.stdout)
-        else:
-            print_warning(f"No data for {metric}")
-        print()
-
-    return 0
-
-
-def get_ec2_metrics(instance_id: str, hours: int = DEFAULT_HOURS) -> int:
-    print_header(f"EC2 Metrics: {instance_id}")
-
-    start_time, end_time = get_time_range(hours)
-
-    metrics = [
-        ("CPUUtilization", "CPU Utilization", "Average"),
-        ("NetworkIn", "Network In (bytes)", "Sum"),
-        ("NetworkOut", "Network Out (bytes)", "Sum"),
-    ]
-
-    for metric, label, stat in metrics:
-        print(f"{label}:")
-        result = run_aws_command([
-            "cloudwatch", "get-metric-statistics",
-            "--namespace", "AWS/EC2",
-            "--metric-name", metric,
-            "--dimensions", f"Name=InstanceId,Value={instance_id}",
-            "--start-time", start_time,
-            "--end-time", end_time,
-            "--period", "300",
-            "--statistics", stat,
-            "--query", f"sort_by(Datapoints, &Timestamp)[-5:].[Timestamp,{stat}]",
-            "--output", "table",
-        ])
-        if result.success:
-            print(result.stdout)
-        else:
-            print_warning(f"No data for {metric}")
-        print()
-
-    return 0
-
-
-def get_rds_metrics(db_identifier: str, hours: int = DEFAULT_HOURS) -> int:
-    print_header(f"RDS Metrics: {db_identifier}")
-
-    start_time, end_time = get_time_range(hours)
-
-    metrics = [
-        ("CPUUtilization", "CPU Utilization"),
-        ("DatabaseConnections", "Database Connections"),
-        ("FreeStorageSpace", "Free Storage Space (bytes)"),
-    ]
-
-    for metric, label in metrics:
-        print(f"{label}:")
-        result = run_aws_command([
-            "cloudwatch", "get-metric-statistics",
-            "--namespace", "AWS/RDS",
-            "--metric-name", metric,
-            "--dimensions", f"Name=DBInstanceIdentifier,Value={db_identifier}",
-            "--start-time", start_time,
-            "--end-time", end_time,
-            "--period", "300",
-            "--statistics", "Average",
-            "--query", "sort_by(Datapoints, &Timestamp)[-5:].[Timestamp,Average]",
-            "--output", "table",
-        ])
-        if result.success:
-            print(result.stdout)
-        else:
-            print_warning(f"No data for {metric}")
-        print()
-
-    return 0
+    return show_metrics(METRIC_SPECS["ecs"], [cluster, service], hours)
 
 
 def export_metrics(output_file: str = "metrics.json", hours: int = 24) -> int:
@@ -375,120 +695,104 @@ def export_metrics(output_file: str = "metrics.json", hours: int = 24) -> int:
 
     start_time, end_time = get_time_range(hours)
 
-    print_info(f"Time range: {start_time} to {end_time}")
+    print_info(f"Time range: {start_time.isoformat()} to {end_time.isoformat()}")
     print_info(f"Output file: {output_file}")
 
-    queries = [
-        {
-            "Id": "ec2_cpu",
-            "MetricStat": {
-                "Metric": {
-                    "Namespace": "AWS/EC2",
-                    "MetricName": "CPUUtilization",
-                },
-                "Period": 3600,
-                "Stat": "Average",
-            },
-            "ReturnData": True,
-        },
-        {
-            "Id": "ecs_cpu",
-            "MetricStat": {
-                "Metric": {
-                    "Namespace": "AWS/ECS",
-                    "MetricName": "CPUUtilization",
-                },
-                "Period": 3600,
-                "Stat": "Average",
-            },
-            "ReturnData": True,
-        },
-        {
-            "Id": "rds_cpu",
-            "MetricStat": {
-                "Metric": {
-                    "Namespace": "AWS/RDS",
-                    "MetricName": "CPUUtilization",
-                },
-                "Period": 3600,
-                "Stat": "Average",
-            },
-            "ReturnData": True,
-        },
-        {
-            "Id": "lambda_invocations",
-            "MetricStat": {
-                "Metric": {
-                    "Namespace": "AWS/Lambda",
-                    "MetricName": "Invocations",
-                },
-                "Period": 3600,
-                "Stat": "Sum",
-            },
-            "ReturnData": True,
-        },
-    ]
+    batch = MetricsBatch()
+    batch.add("AWS/EC2", "CPUUtilization", stat="Average", period=3600, query_id="ec2_cpu")
+    batch.add("AWS/ECS", "CPUUtilization", stat="Average", period=3600, query_id="ecs_cpu")
+    batch.add("AWS/RDS", "CPUUtilization", stat="Average", period=3600, query_id="rds_cpu")
+    batch.add("AWS/Lambda", "Invocations", stat="Sum", period=3600, query_id="lambda_invocations")
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-        json.dump(queries, f)
-        queries_file = f.name
+    # A query's datapoints can span pages, so results are merged per Id
+    # before writing, one entry per query.
+    try:
+        results = batch.flush(start_time, end_time)
+    except AwsError as e:
+        print_error(f"Failed to export metrics: {e}")
+        return 1
 
+    # Write next to the target and swap it in, so a failed export never
+    # clobbers an earlier file.
+    output_path = Path(output_file)
     try:
-        result = run_aws_command([
-            "cloudwatch", "get-metric-data",
-            "--metric-data-queries", f"file://{queries_file}",
-            "--start-time", start_time,
-            "--end-time", end_time,
-            "--output", "json",
-        ], timeout=120)
-
-        if result.success:
-            with open(output_file, "w") as f:
-                f.write(result.stdout)
-            print_success(f"Metrics exported to {output_file}")
-            file_size = Path(output_file).stat().st_size
-            print_info(f"File size: {file_size} bytes")
-            return 0
-        else:
-            print_error(f"Failed to export metrics: {result.stderr}")
-            return 1
-    finally:
-        Path(queries_file).unlink(missing_ok=True)
+        tmp = tempfile.NamedTemporaryFile(mode="w", dir=output_path.parent, suffix=".tmp", delete=False)
+    except OSError as e:
+        print_error(f"Failed to write {output_file}: {e}")
+        return 1
+    try:
+        with tmp as f:
+            f.write('{"MetricDataResults": [')
+            for i, result in enumerate(results.values()):
+                f.write(",\n" if i else "\n")
+                f.write(json_dumps(result))
+            f.write('\n], "Messages": ')
+            f.write(json_dumps(batch.messages))
+            f.write("}\n")
+        # NamedTemporaryFile is created 0600; give the export normal permissions.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp.name, 0o666 & ~umask)
+        os.replace(tmp.name, output_path)
+    except OSError as e:
+        Path(tmp.name).unlink(missing_ok=True)
+        print_error(f"Failed to write {output_file}: {e}")
+        return 1
+
+    print_success(f"Metrics exported to {output_file}")
+    file_size = Path(output_file).stat().st_size
+    print_info(f"File size: {file_size} bytes")
+    return 0
 
 
 def list_resources(resource_type: str) -> None:
-    if resource_type == "ec2":
-        print("Running instances:")
-        result = run_aws_command([
-            "ec2", "describe-instances",
-            "--filters", "Name=instance-state-name,Values=running",
-            "--query", "Reservations[*].Instances[*].[InstanceId,Tags[?Key==`Name`].Value|[0]]",
-            "--output", "text",
-        ])
-        if result.success:
-            print(result.stdout)
-    elif resource_type == "ecs":
-        print("Available clusters:")
-        result = run_aws_command([
-            "ecs", "list-clusters",
-            "--query", "clusterArns[*]",
-            "--output", "text",
-        ])
-        if result.success:
-            for arn in result.stdout.strip().split():
+    try:
+        if resource_type == "ec2":
+            print("Running instances:")
+            response = cached_call(
+                "ec2", "describe_instances",
+                Filters=[{"Name": "instance-state-name", "Values": ["running"]}],
+            )
+            print_table(
+                ["Instance", "Name"],
+                [
+                    (
+                        instance["InstanceId"],
+                        next((t["Value"] for t in instance.get("Tags", []) if t["Key"] == "Name"), ""),
+                    )
+                    for reservation in response.get("Reservations", [])
+                    for instance in reservation["Instances"]
+                ],
+            )
+        elif resource_type == "ecs":
+            print("Available clusters:")
+            response = cached_call("ecs", "list_clusters")
+            for arn in response.get("clusterArns", []):
                 print(f"  {arn.split('/')[-1]}")
-    elif resource_type == "rds":
-        print("RDS instances:")
-        result = run_aws_command([
-            "rds", "describe-db-instances",
-            "--query", "DBInstances[*].[DBInstanceIdentifier,Engine,DBInstanceStatus]",
-            "--output", "text",
-        ])
-        if result.success:
-            print(result.stdout)
+        elif resource_type == "rds":
+            print("RDS instances:")
+            response = cached_call("rds", "describe_db_instances")
+            print_table(
+                ["Identifier", "Engine", "Status"],
+                [
+                    (db["DBInstanceIdentifier"], db["Engine"], db["DBInstanceStatus"])
+                    for db in response.get("DBInstances", [])
+                ],
+            )
+    except AwsError:
+        pass
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser, default_ttl: int = CACHE_TTL) -> None:
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument(
+        "--cache-ttl", type=int, default=default_ttl, help="Cache lifetime in seconds (default: %(default)s)"
+    )
 
 
-def main() -> int:
+@lru_cache(maxsize=1)
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser once; later callers reuse it."""
     parser = argparse.ArgumentParser(
         description="AWS CloudWatch Metrics Helper",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -501,6 +805,7 @@ Examples:
     %(prog)s ec2 i-1234567890abcdef0 --hours 6
     %(prog)s rds mydb-instance --hours 12
     %(prog)s export metrics.json --hours 24
+    %(prog)s repl
         """,
     )
 
@@ -508,6 +813,7 @@ Examples:
 
     list_parser = subparsers.add_parser("list", help="List available metrics")
     list_parser.add_argument("namespace", nargs="?", help="CloudWatch namespace")
+    add_cache_arguments(list_parser)
 
     get_parser = subparsers.add_parser("get", help="Get specific metric data")
     get_parser.add_argument("metric", help="Metric name")
@@ -518,6 +824,8 @@ Examples:
 
     alarms_parser = subparsers.add_parser("alarms", help="List CloudWatch alarms")
     alarms_parser.add_argument("state", nargs="?", choices=["ALARM", "OK", "INSUFFICIENT_DATA"])
+    # Alarm state changes by the minute, so alarms are read live unless asked.
+    add_cache_arguments(alarms_parser, default_ttl=0)
 
     ecs_parser = subparsers.add_parser("ecs", help="Get ECS service metrics")
     ecs_parser.add_argument("cluster", help="ECS cluster name")
@@ -525,52 +833,121 @@ Examples:
     ecs_parser.add_argument("--hours", type=int, default=DEFAULT_HOURS, help="Hours of data")
 
     ec2_parser = subparsers.add_parser("ec2", help="Get EC2 instance metrics")
-    ec2_parser.add_argument("instance_id", help="EC2 instance ID")
+    ec2_parser.add_argument("identifier", metavar="instance_id", help="EC2 instance ID")
     ec2_parser.add_argument("--hours", type=int, default=DEFAULT_HOURS, help="Hours of data")
 
     rds_parser = subparsers.add_parser("rds", help="Get RDS instance metrics")
-    rds_parser.add_argument("db_identifier", help="RDS DB instance identifier")
+    rds_parser.add_argument("identifier", metavar="db_identifier", help="RDS DB instance identifier")
     rds_parser.add_argument("--hours", type=int, default=DEFAULT_HOURS, help="Hours of data")
 
     export_parser = subparsers.add_parser("export", help="Export metrics to JSON")
     export_parser.add_argument("output_file", nargs="?", default="metrics.json", help="Output file")
     export_parser.add_argument("--hours", type=int, default=24, help="Hours of data")
 
-    args = parser.parse_args()
+    subparsers.add_parser("repl", help="Run commands interactively in one session")
+
+    return parser
+
 
+def get_metric_command(args: argparse.Namespace) -> int:
+    dim_name, dim_value = None, None
+    if args.dimension:
+        parts = args.dimension.split("=", 1)
+        if len(parts) == 2:
+            dim_name, dim_value = parts
+    return get_metric(
+        args.metric,
+        args.namespace,
+        dim_name,
+        dim_value,
+        args.hours,
+        args.period,
+    )
+
+
+def dispatch(args: argparse.Namespace) -> int:
+    """Run the command selected by parsed arguments."""
     if not args.command:
-        parser.print_help()
+        build_parser().print_help()
         return 0
 
-    if args.command == "list":
-        return list_metrics(args.namespace)
-    elif args.command == "get":
-        dim_name, dim_value = None, None
-        if args.dimension:
-            parts = args.dimension.split("=", 1)
-            if len(parts) == 2:
-                dim_name, dim_value = parts
-        return get_metric(
-            args.metric,
-            args.namespace,
-            dim_name,
-            dim_value,
-            args.hours,
-            args.period,
-        )
-    elif args.command == "alarms":
-        return list_alarms(args.state)
-    elif args.command == "ecs":
-        return get_ecs_metrics(args.cluster, args.service, args.hours)
-    elif args.command == "ec2":
-        return get_ec2_metrics(args.instance_id, args.hours)
-    elif args.command == "rds":
-        return get_rds_metrics(args.db_identifier, args.hours)
-    elif args.command == "export":
-        return export_metrics(args.output_file, args.hours)
-
+    # Commands with their own handler first (ecs also lists services);
+    # the remaining METRIC_SPECS entries share get_service_metrics.
+    if handler := COMMAND_HANDLERS.get(args.command):
+        return handler(args)
+    if args.command in METRIC_SPECS:
+        return get_service_metrics(args.command, args.identifier, args.hours)
     return 0
 
 
+def repl() -> int:
+    """Read commands from stdin and run each one in this process.
+
+    Every command shares the boto3 session and cached clients, so after the
+    first one only the API calls themselves cost anything.
+    """
+    import shlex
+
+    try:
+        import readline  # noqa: F401 - line editing and history for input()
+    except ImportError:
+        pass
+
+    parser = build_parser()
+    print("Type a command (e.g. 'ec2 i-1234567890abcdef0'), 'help', or 'exit'.")
+    while True:
+        try:
+            line = input("aws_metrics> ")
+        except EOFError:
+            print()
+            return 0
+        except KeyboardInterrupt:
+            print()
+            continue
+
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print_error(str(e))
+            continue
+        if not argv:
+            continue
+        if argv[0] in ("exit", "quit"):
+            return 0
+        if argv[0] == "help":
+            parser.print_help()
+            continue
+
+        try:
+            args = parser.parse_args(argv)
+        except SystemExit:
+            # argparse has already printed the usage or error message.
+            continue
+        if args.command == "repl":
+            continue
+
+        try:
+            dispatch(args)
+        except KeyboardInterrupt:
+            print()
+        except Exception as e:
+            # One failing command must not end the session.
+            print_error(str(e))
+
+
+COMMAND_HANDLERS: dict[str, Callable[[argparse.Namespace], int]] = {
+    "list": lambda args: list_metrics(args.namespace, 0 if args.no_cache else args.cache_ttl),
+    "get": get_metric_command,
+    "alarms": lambda args: list_alarms(args.state, 0 if args.no_cache else args.cache_ttl),
+    "ecs": lambda args: get_ecs_metrics(args.cluster, args.service, args.hours),
+    "export": lambda args: export_metrics(args.output_file, args.hours),
+    "repl": lambda args: repl(),
+}
+
+
+def main() -> int:
+    return dispatch(build_parser().parse_args())
+
+
 if __name__ == "__main__":
     sys.exit(main())